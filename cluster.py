@@ -0,0 +1,213 @@
+import re
+import logging
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from processor import are_urls_similar
+
+
+# 常见繁体字 → 简体字（未安装 opencc 时的回退表，覆盖频道名常用字）
+_T2S_TABLE = str.maketrans({
+    "衛": "卫", "視": "视", "臺": "台", "電": "电", "劇": "剧", "場": "场",
+    "綜": "综", "藝": "艺", "體": "体", "聞": "闻", "華": "华", "國": "国",
+    "際": "际", "經": "经", "濟": "济", "財": "财", "樂": "乐", "動": "动",
+    "畫": "画", "紀": "纪", "錄": "录", "兒": "儿", "線": "线", "東": "东",
+    "廣": "广", "鳳": "凤", "門": "门", "灣": "湾", "鄉": "乡", "農": "农",
+    "業": "业", "軍": "军", "龍": "龙", "亞": "亚", "歐": "欧", "韓": "韩",
+    "戲": "戏", "麗": "丽", "園": "园", "頻": "频", "測": "测", "試": "试",
+    "費": "费", "網": "网", "環": "环", "遊": "游", "購": "购", "資": "资",
+    "訊": "讯", "數": "数", "碼": "码", "無": "无", "萬": "万", "愛": "爱",
+    "時": "时", "風": "风", "雲": "云", "語": "语", "漢": "汉", "說": "说",
+    "書": "书", "學": "学", "點": "点", "達": "达", "車": "车", "馬": "马",
+    "鐵": "铁", "聯": "联", "賽": "赛", "籃": "篮", "極": "极", "會": "会",
+    "氣": "气", "衞": "卫", "紅": "红", "黃": "黄", "藍": "蓝", "綠": "绿", "鑽": "钻",
+    "寶": "宝", "貝": "贝", "魚": "鱼", "鳥": "鸟", "開": "开", "關": "关",
+    "與": "与", "術": "术", "錢": "钱", "證": "证", "員": "员",
+})
+
+# 画质 / 清晰度后缀，归一化时逐个去除
+_QUALITY_SUFFIX = re.compile(
+    r'[\s\-_]*(uhd|fhd|hd|sd|4k|8k|2160p|1080p|720p|高清|超清|标清|蓝光|超高清)$'
+)
+# 去除标点与空白，保留 '+'（避免 CCTV5 与 CCTV5+ 被合并）
+_NON_WORD = re.compile(r'[^\w+]|_')
+_DIGITS = re.compile(r'\d')
+# 数字及紧随的字母（如 "1"、"4k"），用于判断两个键能否合并
+_NUM_TOKEN = re.compile(r'\d+[a-z]*')
+
+
+def _load_t2s():
+    """获取繁转简函数，优先使用 opencc"""
+    try:
+        import opencc
+        converter = opencc.OpenCC("t2s")
+        return converter.convert
+    except ImportError:
+        return lambda s: s.translate(_T2S_TABLE)
+    except Exception as e:
+        logging.warning(f"[WARN] opencc 初始化失败: {e}，使用内置繁简表")
+        return lambda s: s.translate(_T2S_TABLE)
+
+
+_t2s = _load_t2s()
+
+
+def canonical_key(name: str) -> str:
+    """
+    频道名规范化键
+    - 全角转半角（NFKC）
+    - 繁体转简体
+    - 去除 HD/4K/高清 等后缀
+    - 去除标点与空白
+    """
+    key = unicodedata.normalize("NFKC", name)
+    key = _t2s(key).lower().strip()
+    key = _strip_quality(key)
+    key = _NON_WORD.sub("", key)
+    return key or name.strip().lower()
+
+
+def _strip_quality(key: str) -> str:
+    """
+    逐个去除画质后缀
+    数字开头的后缀（4k/1080p 等）去除后若只剩不含数字的字母台名，
+    说明数字属于台名本身（如 CCTV-4K、CCTV8K），保留不去除
+    """
+    while True:
+        m = _QUALITY_SUFFIX.search(key)
+        if not m:
+            return key
+        rest = key[:m.start()]
+        stem = _NON_WORD.sub("", rest)
+        if not stem:
+            return key
+        if (m.group(1)[0].isdigit() and stem[-1].isascii() and stem[-1].isalpha()
+                and not _DIGITS.search(stem)):
+            return key
+        key = rest
+
+
+def _ngrams(key: str, n: int = 2) -> frozenset:
+    """字符 n-gram 集合"""
+    if len(key) <= n:
+        return frozenset([key])
+    return frozenset(key[i:i + n] for i in range(len(key) - n + 1))
+
+
+def _compatible(key1: str, key2: str) -> bool:
+    """数字与 '+' 必须一致，防止 CCTV-1 / CCTV-11、CCTV-4K / CCTV-4、CCTV5 / CCTV5+ 误合并"""
+    return (_NUM_TOKEN.findall(key1) == _NUM_TOKEN.findall(key2)
+            and ("+" in key1) == ("+" in key2))
+
+
+def cluster_names(names: List[str], threshold: float = 0.8,
+                  max_block_size: int = 64) -> Dict[str, List[str]]:
+    """
+    对频道名聚类
+    :param names: 频道名列表（顺序即优先级，靠前者作为簇代表）
+    :param threshold: n-gram Jaccard 相似度阈值
+    :param max_block_size: 单个 n-gram 倒排表上限，达到后视为高频 n-gram 不再用于生成候选
+    :return: {代表名: [成员名, ...]}（成员包含代表名本身）
+    """
+    # 第一步：规范化键完全相同的直接归并
+    key_members = {}
+    for name in names:
+        key_members.setdefault(canonical_key(name), []).append(name)
+
+    # 第二步：对不同的键做 leader 聚类，用 n-gram 倒排索引分块，避免两两比较
+    leader_of = {}
+    leader_grams = {}
+    index = defaultdict(list)
+    for key in key_members:
+        grams = _ngrams(key)
+        candidates = set()
+        for g in grams:
+            postings = index.get(g, ())
+            # 高频 n-gram（如 "cc"、"tv"）区分度低，不用于生成候选，以控制候选规模
+            if len(postings) >= max_block_size:
+                continue
+            candidates.update(postings)
+
+        best, best_score = None, threshold
+        for leader in candidates:
+            other = leader_grams[leader]
+            # 长度剪枝：Jaccard 上界 = min/max
+            if min(len(grams), len(other)) < threshold * max(len(grams), len(other)):
+                continue
+            # 相似度按完整 n-gram 集合精确计算，不受高频 n-gram 截断影响
+            common = len(grams & other)
+            score = common / (len(grams) + len(other) - common)
+            if score >= best_score and _compatible(key, leader):
+                best, best_score = leader, score
+
+        if best is not None:
+            leader_of[key] = best
+            continue
+
+        leader_of[key] = key
+        leader_grams[key] = grams
+        for g in grams:
+            postings = index[g]
+            if len(postings) < max_block_size:
+                postings.append(key)
+
+    clusters = {}
+    leader_rep = {}
+    for key, members in key_members.items():
+        leader = leader_of[key]
+        if leader not in leader_rep:
+            leader_rep[leader] = key_members[leader][0]
+        clusters.setdefault(leader_rep[leader], []).extend(members)
+    return clusters
+
+
+def merge_clusters(channels: Dict[str, dict], keep_multiple_urls: bool,
+                   threshold: float = 0.8) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    合并近似重复的频道
+    :param channels: 频道字典（已完成别名归并与多源合并）
+    :param keep_multiple_urls: 是否保留多URL
+    :param threshold: 相似度阈值
+    :return: (合并后的频道字典, 建议追加到 alias.txt 的行)
+    """
+    clusters = cluster_names(list(channels.keys()), threshold)
+
+    merged = {}
+    suggestions = []
+    groups = 0
+    for rep, members in clusters.items():
+        ch = channels[rep]
+        for name in members[1:]:
+            if not keep_multiple_urls:
+                break
+            for url in channels[name]["urls"]:
+                if not any(are_urls_similar(url, existing) for existing in ch["urls"]):
+                    ch["urls"].append(url)
+        merged[rep] = ch
+        if len(members) > 1:
+            groups += 1
+            logging.debug(f"[CLUSTER] {rep} ← {', '.join(members[1:])}")
+            # alias.txt 以 ',' 分隔，含 ',' 的频道名无法写成建议行
+            if any("," in name for name in members):
+                logging.warning(f"[CLUSTER] 频道名含 ','，不生成别名建议: {' | '.join(members)}")
+                continue
+            suggestions.append(",".join(members))
+
+    logging.info(f"[CLUSTER] 频道聚类: {len(channels)} → {len(merged)}，"
+                 f"合并 {groups} 组，生成 {len(suggestions)} 条别名建议")
+    return merged, suggestions
+
+
+def write_alias_suggestions(suggestions: List[str],
+                            outfile: Optional[str] = "alias_suggest.txt") -> None:
+    """将聚类结果写成 alias.txt 格式的建议行"""
+    if not suggestions or not outfile:
+        return
+    try:
+        with open(outfile, "w", encoding="utf-8") as f:
+            f.write("# 频道聚类生成的别名建议，确认后可追加到 alias.txt\n")
+            f.write("\n".join(suggestions) + "\n")
+        logging.info(f"[CLUSTER] 已生成别名建议文件: {outfile}")
+    except Exception as e:
+        logging.warning(f"[WARN] 写入别名建议文件失败: {e}")
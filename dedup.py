@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from processor import normalize_url
+
+
+class _BodyEntry:
+    """同一内容哈希的首个源（负责解析）"""
+
+    def __init__(self, source_index: int, url: str):
+        self.source_index = source_index
+        self.url = url
+        self.digest = None
+        # 解析结果仅在首个源合并前保留，供索引更靠前的重复源复用
+        self.channels = None
+
+
+class ContentRegistry:
+    """
+    本次运行内的源内容登记表（线程安全）
+    - 按响应体哈希识别完全相同的镜像源，只解析一次
+    - 按归一化 (频道名, URL) 集合识别内容等价的源，合并时跳过
+    - 汇总报告内容为其他源子集的源
+    解析在单线程中按到达顺序进行，重复源登记时首个源必然已处理完成
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self._owners = {}
+        self._digests = {}
+        self._sizes = {}
+        self._masks = {}
+
+    @staticmethod
+    def body_key(content: bytes, include_channels: Optional[List[str]] = None) -> str:
+        """响应体哈希（白名单不同则解析结果不同，一并计入）"""
+        h = hashlib.sha256(content)
+        if include_channels:
+            h.update("\n".join(include_channels).encode("utf-8"))
+        return h.hexdigest()
+
+    def claim(self, key: str, source_index: int, url: str) -> Tuple[_BodyEntry, bool]:
+        """
+        登记内容哈希，返回 (登记项, 是否由当前源负责解析)
+        首个源解析失败时由当前源重新负责
+        """
+        with self._lock:
+            entry = self._bodies.get(key)
+            if entry is None or entry.digest is None:
+                entry = _BodyEntry(source_index, url)
+                self._bodies[key] = entry
+                self._owners[source_index] = entry
+                return entry, True
+            return entry, False
+
+    def publish(self, entry: _BodyEntry, source_index: int, url: str,
+                channels: Dict[str, dict]) -> None:
+        """登记首个源的解析结果，保留至该源合并完成（见 release）"""
+        entry.digest = self.record_pairs(source_index, url, channels)
+        entry.channels = channels
+
+    def resolve_duplicate(self, entry: _BodyEntry, source_index: int) -> Dict[str, dict]:
+        """
+        重复源沿用首个源的集合摘要，合并时按摘要跳过
+        索引靠前的重复源先于首个源合并，需复用其解析结果；否则返回空字典
+        """
+        with self._lock:
+            self._digests[source_index] = entry.digest
+        if source_index < entry.source_index and entry.channels is not None:
+            return entry.channels
+        return {}
+
+    def release(self, source_index: int) -> None:
+        """源已合并（或跳过），释放其作为首个源保留的解析结果"""
+        with self._lock:
+            entry = self._owners.pop(source_index, None)
+        if entry is not None:
+            entry.channels = None
+
+    def record_pairs(self, source_index: int, url: str, channels: Dict[str, dict]) -> str:
+        """
+        记录源的归一化 (频道名, URL) 集合，返回其摘要
+        集合本身不保留：每个 (频道名, URL) 只记一个哈希 → 包含它的源位图，
+        子集关系在 report_subsets 中由位图统计得出
+        """
+        pairs = {(name, normalize_url(u)) for name, ch in channels.items() for u in ch["urls"]}
+        digest = hashlib.sha256(
+            "\n".join(sorted(f"{n}\t{u}" for n, u in pairs)).encode("utf-8")
+        ).hexdigest()
+        bit = 1 << source_index
+        with self._lock:
+            self._digests[source_index] = digest
+            self._sizes[source_index] = len(pairs)
+            for pair in pairs:
+                key = hash(pair)
+                self._masks[key] = self._masks.get(key, 0) | bit
+        return digest
+
+    def pairs_digest(self, source_index: int) -> Optional[str]:
+        """获取源的 (频道名, URL) 集合摘要"""
+        with self._lock:
+            return self._digests.get(source_index)
+
+    def report_subsets(self, urls: Dict[int, str]) -> List[Tuple[str, str]]:
+        """
+        报告内容为其他源真子集的源
+        :param urls: {源索引: URL}
+        :return: [(子集源URL, 包含它的源URL), ...]
+        """
+        with self._lock:
+            sizes = dict(self._sizes)
+            mask_counts = Counter(self._masks.values())
+
+        # 两两交集大小：不同位图的种类远少于 (频道名, URL) 数量
+        overlap = Counter()
+        for mask, count in mask_counts.items():
+            members = [idx for idx in sizes if mask >> idx & 1]
+            for idx in members:
+                for other_idx in members:
+                    if other_idx != idx:
+                        overlap[idx, other_idx] += count
+
+        subsets = []
+        for idx in sorted(sizes):
+            if not sizes[idx]:
+                continue
+            for other_idx in sorted(sizes):
+                if (other_idx != idx and overlap[idx, other_idx] == sizes[idx]
+                        and sizes[idx] < sizes[other_idx]):
+                    subsets.append((urls.get(idx, str(idx)), urls.get(other_idx, str(other_idx))))
+                    logging.info(f"[DEDUP] {urls.get(idx)} 的内容是 {urls.get(other_idx)} 的子集")
+                    break
+        return subsets
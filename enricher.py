@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import quote, urlparse
+
+
+def load_logo_cache(cache_file: str) -> Dict[str, dict]:
+    """加载持久化的 频道名 → 台标 缓存"""
+    if not cache_file or not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except Exception as e:
+        logging.warning(f"[WARN] 台标缓存读取失败: {e}，将重新获取")
+        return {}
+
+
+def save_logo_cache(cache: Dict[str, dict], cache_file: str) -> None:
+    """保存台标缓存（原子写入）"""
+    if not cache_file:
+        return
+    temp_fd, temp_path = tempfile.mkstemp(suffix='.json', text=True)
+    try:
+        with os.fdopen(temp_fd, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=1, sort_keys=True)
+        shutil.move(temp_path, cache_file)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        logging.warning(f"[WARN] 台标缓存写入失败: {e}")
+
+
+def set_logo(line: str, logo: str) -> str:
+    """写入 EXTINF 行的 tvg-logo 属性"""
+    if 'tvg-logo="' in line:
+        return re.sub(r'tvg-logo="[^"]*"', lambda _: f'tvg-logo="{logo}"', line, count=1)
+    if ' group-title="' in line:
+        return line.replace(' group-title="', f' tvg-logo="{logo}" group-title="', 1)
+    return re.sub(r'^(#EXTINF:-?\d+)', lambda m: f'{m.group(1)} tvg-logo="{logo}"', line, count=1)
+
+
+def validate_logo(session, url: str, timeout: float) -> bool:
+    """HEAD 校验台标地址可用（不支持 HEAD 的服务器回退到 GET）"""
+    try:
+        resp = session.head(url, timeout=timeout, allow_redirects=True)
+        if resp.status_code in (403, 405, 501):
+            resp = session.get(url, timeout=timeout, stream=True)
+            resp.close()
+        if resp.status_code != 200:
+            return False
+        content_type = resp.headers.get("Content-Type", "")
+        return not content_type or content_type.startswith("image/")
+    except Exception:
+        return False
+
+
+def mirror_logo(session, url: str, mirror_dir: str, url_prefix: str,
+                timeout: float) -> Optional[str]:
+    """下载台标到本地目录，返回 url_prefix 下的镜像地址（已存在则不重复下载）"""
+    ext = os.path.splitext(urlparse(url).path)[1] or ".png"
+    filename = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + ext
+    path = os.path.join(mirror_dir, filename)
+    if not os.path.exists(path):
+        try:
+            resp = session.get(url, timeout=timeout)
+            resp.raise_for_status()
+            os.makedirs(mirror_dir, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(resp.content)
+        except Exception as e:
+            logging.debug(f"[LOGO] 镜像失败: {url} - {e}")
+            return None
+    return f"{url_prefix}{filename}"
+
+
+def enrich_logos(channels: Dict[str, dict], groups_config: dict, config: dict,
+                 session) -> None:
+    """
+    为所有频道补全 tvg-logo
+    优先级: groups.json 的 logos 映射 > 源自带台标 > 缓存 > logo_url_template 预取
+    - 缓存按 频道名 + 候选地址 命中，更换模板后旧结果（包括无效记录）视为未命中
+    - 缓存未命中的频道批量并发 HEAD 校验，结果（包括无效）按 TTL 缓存
+    - 配置 logo_mirror_dir 时将台标镜像到本地
+    :param channels: 频道字典（就地修改 line）
+    :param groups_config: groups.json 配置
+    :param config: config.yaml 配置
+    :param session: requests session
+    """
+    logo_map = groups_config.get("logos", {})
+    template = config.get("logo_url_template", "")
+    cache_file = config.get("logo_cache_file", "")
+    ttl = config.get("logo_cache_ttl", 168) * 3600
+    timeout = config["timeout"]
+    mirror_dir = config.get("logo_mirror_dir", "")
+    mirror_prefix = config.get("logo_mirror_url_prefix", "")
+
+    cache = load_logo_cache(cache_file)
+    now = time.time()
+
+    resolved = {}
+    missing = []
+    candidates = []
+    for name, ch in channels.items():
+        if logo_map.get(name):
+            resolved[name] = logo_map[name]
+            continue
+        m = re.search(r'tvg-logo="([^"]+)"', ch["line"])
+        if m:
+            resolved[name] = m.group(1)
+            continue
+        if not template:
+            continue
+        candidate = template.replace("{name}", quote(name, safe=""))
+        entry = cache.get(name)
+        if entry and entry.get("url") == candidate and now - entry.get("ts", 0) < ttl:
+            if entry.get("logo"):
+                resolved[name] = entry["logo"]
+            continue
+        missing.append(name)
+        candidates.append(candidate)
+
+    # 批量预取：并发校验缓存未命中的频道
+    if missing:
+        max_workers = min(config.get("max_concurrent_downloads", 5) * 2, len(missing))
+        logging.info(f"[LOGO] 预取 {len(missing)} 个频道台标")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(
+                lambda url: validate_logo(session, url, timeout), candidates
+            ))
+        for name, url, ok in zip(missing, candidates, results):
+            cache[name] = {"url": url, "logo": url if ok else "", "ts": now}
+            if ok:
+                resolved[name] = url
+        save_logo_cache(cache, cache_file)
+
+    # 可选：镜像到本地（未配置对外地址前缀时保留原始地址）
+    if mirror_dir and mirror_prefix and resolved:
+        urls = sorted(set(resolved.values()))
+        with ThreadPoolExecutor(max_workers=config.get("max_concurrent_downloads", 5)) as executor:
+            mirrored = dict(zip(urls, executor.map(
+                lambda url: mirror_logo(session, url, mirror_dir, mirror_prefix, timeout), urls
+            )))
+        resolved = {name: mirrored.get(url) or url for name, url in resolved.items()}
+
+    for name, logo in resolved.items():
+        channels[name]["line"] = set_logo(channels[name]["line"], logo)
+
+    logging.info(f"[LOGO] 台标补全: {len(resolved)}/{len(channels)} 个频道")
@@ -24,6 +24,20 @@ def validate_config(config: dict) -> bool:
             raise ValueError("max_concurrent_downloads 必须大于 0")
         if config["max_concurrent_downloads"] > 20:
             logging.warning("max_concurrent_downloads 过大可能导致网络拥堵，建议设置为 5-10")
+
+    # 验证台标地址模板
+    template = config.get("logo_url_template", "")
+    if template and "{name}" not in template:
+        raise ValueError("logo_url_template 必须包含 {name} 占位符")
+    
+    # 台标镜像必须配置对外访问地址，否则导出的是服务器本地路径，播放器无法访问
+    if config.get("logo_mirror_dir") and not config.get("logo_mirror_url_prefix"):
+        raise ValueError("配置 logo_mirror_dir 时必须同时配置 logo_mirror_url_prefix")
+    
+    # 验证聚类阈值
+    if "cluster_threshold" in config:
+        if not 0 < config["cluster_threshold"] <= 1:
+            raise ValueError("cluster_threshold 必须在 (0, 1] 范围内")
     
     return True
 
@@ -47,6 +61,14 @@ def load_config() -> dict:
         "force_logo": False,
         "force_tvg_id": False,
         "max_concurrent_downloads": 5,  # 新增：最大并发下载数
+        "cluster_channels": False,
+        "cluster_threshold": 0.8,
+        "alias_suggest_file": "alias_suggest.txt",
+        "logo_url_template": "",
+        "logo_cache_file": "logo_cache.json",
+        "logo_cache_ttl": 168,
+        "logo_mirror_dir": "",
+        "logo_mirror_url_prefix": "",
     }
 
     for k, v in defaults.items():
@@ -79,6 +101,7 @@ def load_groups() -> dict:
     groups.setdefault("rules", {})
     groups.setdefault("custom_channels", [])
     groups.setdefault("blocklist", [])
+    groups.setdefault("logos", {})
     
     return groups
 
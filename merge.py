@@ -1,13 +1,17 @@
 import logging
 import requests
 import time
+import queue
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from loader import load_config, load_sources, load_groups, load_alias
 from processor import process_lines, convert_txt_to_m3u
 from exporter import export_m3u
+from cluster import merge_clusters, write_alias_suggestions
+from dedup import ContentRegistry
+from enricher import enrich_logos
 
 
 def get_session_with_retries(retries=3):
@@ -68,23 +72,23 @@ def validate_url(url: str) -> bool:
         return False
 
 
-def fetch_remote_source(src, config, session, alias_map, rules, blocklist, 
-                       keep_multiple_urls, default_group, source_index):
+def download_remote_source(src, config, session, source_index):
     """
-    线程安全的远程源获取函数
-    返回: (source_index, channels_dict, success, url, error_msg)
+    流水线第一阶段：下载远程源（网络 I/O）
+    返回: (source_index, url, include_channels, content, error_msg)
     """
+    url = None
+    include_channels = []
     try:
         if isinstance(src, str):
             url = src
-            include_channels = []
         else:
             url = src.get("url")
             include_channels = src.get("include_channels", [])
 
         # URL 验证
         if not validate_url(url):
-            return (source_index, {}, False, url, "非法URL")
+            return (source_index, url, include_channels, None, "非法URL")
 
         headers = {"User-Agent": config["ua"]}
         if config["referrer"]:
@@ -93,41 +97,140 @@ def fetch_remote_source(src, config, session, alias_map, rules, blocklist,
         logging.info(f"[→] 正在获取远程文件: {url}")
         resp = session.get(url, headers=headers, timeout=config["timeout"])
         resp.raise_for_status()
+        return (source_index, url, include_channels, resp.content, None)
+
+    except requests.exceptions.Timeout:
+        return (source_index, url, include_channels, None, "请求超时")
+    except requests.exceptions.ConnectionError:
+        return (source_index, url, include_channels, None, "连接失败")
+    except requests.exceptions.HTTPError as e:
+        return (source_index, url, include_channels, None, f"HTTP错误 {e.response.status_code}")
+    except Exception as e:
+        return (source_index, url, include_channels, None, str(e))
 
-        try:
-            text = resp.content.decode("utf-8", errors="ignore").strip()
-        except Exception:
-            text = resp.text.strip()
+
+def parse_remote_source(source_index, url, include_channels, content, config,
+                        alias_map, rules, blocklist, keep_multiple_urls,
+                        default_group, registry=None):
+    """
+    流水线第二阶段：解析远程源内容（CPU）
+    registry: 内容登记表，响应体与已处理源完全相同时不再解析，合并时按摘要跳过
+    返回: (source_index, channels_dict, success, url, error_msg)
+    """
+    try:
+        text = content.decode("utf-8", errors="ignore").strip()
 
         if not text:
             return (source_index, {}, False, url, "返回空内容")
 
+        # 内容哈希去重：镜像源只解析一次
+        entry, is_owner = None, True
+        if registry is not None:
+            body_key = registry.body_key(content, include_channels)
+            entry, is_owner = registry.claim(body_key, source_index, url)
+            if not is_owner:
+                logging.info(f"[DEDUP] {url} 与 {entry.url} 内容完全相同，跳过解析")
+                return (source_index, registry.resolve_duplicate(entry, source_index), True, url, None)
+
         lines = text.splitlines()
         first_line = lines[0].lstrip("\ufeff").strip().upper() if lines else ""
         if not first_line.startswith("#EXTM3U") and not first_line.startswith("EXTM3U"):
             logging.warning(f"[!] {url} 首行不是标准 M3U，尝试转换")
             lines = convert_txt_to_m3u(lines, default_group)
 
-        # 每个线程独立处理，返回频道字典
+        # 每个源独立处理，返回频道字典
         temp_channels = {}
         process_lines(lines[1:], alias_map, rules, blocklist,
                      keep_multiple_urls, temp_channels,
                      primary=False, source_name=f"远程:{url}",
                      default_group=default_group,
                      whitelist=include_channels)
+
+        if registry is not None:
+            registry.publish(entry, source_index, url, temp_channels)
         
         return (source_index, temp_channels, True, url, None)
 
-    except requests.exceptions.Timeout:
-        return (source_index, {}, False, url, "请求超时")
-    except requests.exceptions.ConnectionError:
-        return (source_index, {}, False, url, "连接失败")
-    except requests.exceptions.HTTPError as e:
-        return (source_index, {}, False, url, f"HTTP错误 {e.response.status_code}")
     except Exception as e:
         return (source_index, {}, False, url, str(e))
 
 
+def remote_pipeline(remote_sources, config, session, alias_map, rules, blocklist,
+                    keep_multiple_urls, default_group, registry=None):
+    """
+    远程源流水线：下载 → 解析 → 按源索引顺序产出
+    - 下载使用线程池并发，解析在独立线程中进行，与网络 I/O 重叠
+    - 结果经重排缓冲区按源索引顺序产出，只要前缀完整即可开始合并（保持原有优先级逻辑）
+    - 同时在途的源数量受窗口限制，避免所有 temp_channels 同时驻留内存
+    生成: (source_index, channels_dict, success, url, error_msg)
+    """
+    total = len(remote_sources)
+    max_workers = min(config.get("max_concurrent_downloads", 5), total)
+    window = max_workers * 2
+    slots = threading.Semaphore(window)
+    stop = threading.Event()
+    # 队列长度受窗口约束，无需另设上限（收尾时放入哨兵不会阻塞）
+    parse_queue = queue.Queue()
+    result_queue = queue.Queue()
+
+    def download_task(idx, src):
+        item = download_remote_source(src, config, session, idx)
+        if item[4] is None:
+            parse_queue.put(item)
+        else:
+            source_index, url, _, _, error_msg = item
+            result_queue.put((source_index, {}, False, url, error_msg))
+
+    def feed(executor):
+        # 按索引顺序提交，窗口占满时阻塞，直到合并阶段消费掉最早的结果
+        for idx, src in enumerate(remote_sources):
+            slots.acquire()
+            if stop.is_set():
+                return
+            executor.submit(download_task, idx, src)
+
+    def parse_worker():
+        # 解析受 GIL 限制，单线程即可与下载重叠
+        while True:
+            item = parse_queue.get()
+            if item is None or stop.is_set():
+                return
+            source_index, url, include_channels, content, _ = item
+            result_queue.put(parse_remote_source(
+                source_index, url, include_channels, content, config,
+                alias_map, rules, blocklist, keep_multiple_urls,
+                default_group, registry
+            ))
+
+    parser = threading.Thread(target=parse_worker, daemon=True)
+    parser.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            feeder = threading.Thread(target=feed, args=(executor,), daemon=True)
+            feeder.start()
+            try:
+                # 重排缓冲区：按完成顺序接收，按索引顺序产出
+                pending = {}
+                next_index = 0
+                while next_index < total:
+                    result = result_queue.get()
+                    pending[result[0]] = result
+                    while next_index in pending:
+                        yield pending.pop(next_index)
+                        next_index += 1
+                        slots.release()
+            finally:
+                # 正常结束、调用方提前关闭或合并出错时，都要让后台线程退出
+                stop.set()
+                for _ in range(window):
+                    slots.release()
+                feeder.join()
+    finally:
+        # 线程池退出时在途下载已全部完成，此后不会再有新的解析任务
+        parse_queue.put(None)
+        parser.join()
+
+
 def merge_channels(target, source, is_primary, keep_multiple_urls):
     """
     合并频道字典（保持原有逻辑）
@@ -221,47 +324,58 @@ def main():
     # ===== 远程源并发下载 =====
     remote_sources = sources.get("remote_urls", [])
     remote_count = 0
+    skipped_count = 0
+    registry = ContentRegistry()
     
     if remote_sources:
         # 并发配置
         max_workers = min(config.get("max_concurrent_downloads", 5), len(remote_sources))
         logging.info(f"[INFO] 使用 {max_workers} 个线程并发下载 {len(remote_sources)} 个远程源")
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有下载任务
-            futures = {}
-            for idx, src in enumerate(remote_sources):
-                future = executor.submit(
-                    fetch_remote_source, src, config, session, 
-                    alias_map, rules, blocklist, keep_multiple_urls, 
-                    default_group, idx
-                )
-                futures[future] = idx
-            
-            # 按完成顺序处理结果，但按索引顺序合并（保持原有优先级逻辑）
-            results = []
-            for future in as_completed(futures):
-                result = future.result()
-                results.append(result)
-            
-            # 按源索引排序（保持原有顺序逻辑）
-            results.sort(key=lambda x: x[0])
-            
-            # 按顺序合并频道
-            for source_index, temp_channels, success, url, error_msg in results:
-                if success:
-                    # 第一个成功的源作为主源（如果没有本地源）
-                    is_primary = (local_count == 0 and remote_count == 0)
-                    merge_channels(channels, temp_channels, is_primary, keep_multiple_urls)
-                    logging.info(f"[✓] 成功读取远程文件: {url}")
+        # 流水线：下载与解析并行，结果按源索引顺序到达即合并
+        seen_digests = {}
+        source_urls = {}
+        for source_index, temp_channels, success, url, error_msg in remote_pipeline(
+                remote_sources, config, session, alias_map, rules, blocklist,
+                keep_multiple_urls, default_group, registry):
+            # 更靠前的重复源均已合并，登记表不再保留该源的解析结果
+            registry.release(source_index)
+            if success:
+                source_urls[source_index] = url
+                # (频道名, URL) 集合与已合并的源相同，合并结果不变，直接跳过
+                digest = registry.pairs_digest(source_index)
+                if digest in seen_digests:
+                    logging.info(f"[✓] 成功读取远程文件: {url}（与 {seen_digests[digest]} 频道内容相同，跳过合并）")
                     remote_count += 1
-                else:
-                    logging.error(f"[✗] 远程文件读取失败: {url} - {error_msg}")
+                    skipped_count += 1
+                    continue
+                if digest is not None:
+                    seen_digests[digest] = url
+                # 第一个成功的源作为主源（如果没有本地源）
+                is_primary = (local_count == 0 and remote_count == 0)
+                merge_channels(channels, temp_channels, is_primary, keep_multiple_urls)
+                logging.info(f"[✓] 成功读取远程文件: {url}")
+                remote_count += 1
+            else:
+                logging.error(f"[✗] 远程文件读取失败: {url} - {error_msg}")
+
+        registry.report_subsets(source_urls)
 
     # ===== 输出 M3U =====
     if not channels:
         logging.error("[✗] 没有可用的频道数据，无法生成输出文件")
         return
+
+    # ===== 频道名聚类（可选）=====
+    if config["cluster_channels"]:
+        channels, suggestions = merge_clusters(
+            channels, keep_multiple_urls, config["cluster_threshold"]
+        )
+        write_alias_suggestions(suggestions, config["alias_suggest_file"])
+
+    # ===== 台标补全（可选）=====
+    if config["force_logo"]:
+        enrich_logos(channels, groups, config, session)
     
     export_m3u(
         channels,
@@ -280,7 +394,8 @@ def main():
     logging.info(f"[PERFORMANCE] 总耗时: {elapsed_time:.2f}秒")
     if elapsed_time > 0:
         logging.info(f"[PERFORMANCE] 处理速度: {len(channels)/elapsed_time:.1f} 频道/秒")
-    logging.info(f"[SUMMARY] 成功读取 {local_count} 个本地源，{remote_count} 个远程源")
+    logging.info(f"[SUMMARY] 成功读取 {local_count} 个本地源，{remote_count} 个远程源"
+                 f"（其中 {skipped_count} 个内容重复，跳过合并）")
 
 
 if __name__ == "__main__":
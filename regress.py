@@ -0,0 +1,694 @@
+import argparse
+import copy
+import io
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional
+
+import yaml
+
+from loader import load_config, load_sources, load_groups, load_alias, validate_config
+from processor import process_lines, are_urls_similar, is_blocked
+from exporter import export_m3u
+from merge import (get_session_with_retries, download_remote_source,
+                   parse_remote_source, merge_channels)
+from cluster import cluster_names, merge_clusters
+from enricher import set_logo, enrich_logos
+
+
+REGRESS_DIR = "regress"
+BODIES_DIR = os.path.join(REGRESS_DIR, "bodies")
+GOLDEN_FILE = os.path.join(REGRESS_DIR, "golden.m3u")
+BASELINE_FILE = os.path.join(REGRESS_DIR, "baseline.json")
+# 黄金输出由优化前的基线版本生成，保证之后的优化不改变输出
+REFERENCE_REV = "c5c080b"
+# 回放时依次使用的下载并发数，输出必须与并发度无关
+GOLDEN_WORKERS = [1, 2, 5, 20]
+
+
+# ===== 本地 HTTP 桩 =====
+
+def start_stub_server(bodies_dir: str):
+    """启动本地 HTTP 桩，/<源索引> 返回录制的响应体，未录制的返回 404"""
+    bodies_dir = os.path.abspath(bodies_dir)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = os.path.join(bodies_dir, self.path.strip("/") + ".body")
+            if not os.path.exists(path):
+                self.send_error(404)
+                return
+            with open(path, "rb") as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ===== 黄金输出 =====
+
+def record_bodies(config: dict, sources: dict) -> None:
+    """抓取真实远程源响应体并保存（失败的源不保存，回放时返回 404）"""
+    if os.path.exists(BODIES_DIR):
+        shutil.rmtree(BODIES_DIR)
+    os.makedirs(BODIES_DIR)
+    session = get_session_with_retries()
+    for idx, src in enumerate(sources.get("remote_urls", [])):
+        source_index, url, _, content, error_msg = download_remote_source(src, config, session, idx)
+        if error_msg:
+            logging.warning(f"[RECORD] {url} 获取失败: {error_msg}，回放时按失败处理")
+            continue
+        with open(os.path.join(BODIES_DIR, f"{source_index:03d}.body"), "wb") as f:
+            f.write(content)
+        logging.info(f"[RECORD] 已录制: {url} ({len(content)} 字节)")
+
+
+def export_reference(workdir: str, ref: str = REFERENCE_REV) -> str:
+    """导出参考版本的代码到 workdir，返回代码目录"""
+    archive = subprocess.run(["git", "archive", "--format=tar", ref],
+                             check=True, capture_output=True).stdout
+    code_dir = os.path.join(workdir, "ref")
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(code_dir, members=[m for m in tar.getmembers() if m.name.endswith(".py")])
+    return code_dir
+
+
+def replay(bodies_dir: str, code_dir: str = ".", max_workers: Optional[int] = None) -> bytes:
+    """
+    使用真实 sources.json/groups.json/alias.txt 与录制的响应体离线运行 merge.main
+    - 远程地址替换为本地 HTTP 桩
+    - 关闭更新时间频道与台标补全，保证输出可逐字节比对
+    - merge.main 在子进程中以 code_dir 下的代码运行，可用于回放参考版本
+    :return: 生成的 M3U 内容
+    """
+    server = start_stub_server(bodies_dir)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    workdir = tempfile.mkdtemp(prefix="kudog_regress_")
+    try:
+        sources = load_sources()
+        for fname in ["alias.txt"] + sources["local_files"]:
+            if os.path.exists(fname):
+                os.makedirs(os.path.join(workdir, os.path.dirname(fname)), exist_ok=True)
+                shutil.copy(fname, os.path.join(workdir, fname))
+
+        remote = []
+        for idx, src in enumerate(sources["remote_urls"]):
+            stub_url = f"{base}/{idx:03d}"
+            if isinstance(src, str):
+                remote.append(stub_url)
+            else:
+                remote.append(dict(src, url=stub_url))
+        sources["remote_urls"] = remote
+
+        groups = load_groups()
+        groups.setdefault("update_time_config", {})["enabled"] = False
+
+        with open("config.yaml", "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+        config.update({"force_logo": False, "generate_debug_file": False,
+                       "output_file": "regress.m3u"})
+        if max_workers:
+            config["max_concurrent_downloads"] = max_workers
+
+        with open(os.path.join(workdir, "sources.json"), "w", encoding="utf-8") as f:
+            json.dump(sources, f, ensure_ascii=False)
+        with open(os.path.join(workdir, "groups.json"), "w", encoding="utf-8") as f:
+            json.dump(groups, f, ensure_ascii=False)
+        with open(os.path.join(workdir, "config.yaml"), "w", encoding="utf-8") as f:
+            yaml.safe_dump(config, f, allow_unicode=True)
+
+        env = dict(os.environ, PYTHONPATH=os.path.abspath(code_dir))
+        proc = subprocess.run([sys.executable, "-c", "import merge; merge.main()"],
+                              cwd=workdir, env=env, capture_output=True, text=True)
+        output = os.path.join(workdir, "regress.m3u")
+        if proc.returncode != 0 or not os.path.exists(output):
+            raise RuntimeError(f"merge.main 运行失败:\n{proc.stdout}{proc.stderr}")
+        with open(output, "rb") as f:
+            return f.read()
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def record_golden(ref: str = REFERENCE_REV) -> None:
+    """用参考版本（优化前）的代码回放录制的响应体，生成黄金输出"""
+    workdir = tempfile.mkdtemp(prefix="kudog_ref_")
+    try:
+        golden = replay(BODIES_DIR, export_reference(workdir, ref))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    with open(GOLDEN_FILE, "wb") as f:
+        f.write(golden)
+    logging.info(f"[RECORD] 已用 {ref} 生成黄金输出: {GOLDEN_FILE}")
+
+
+def check_golden() -> List[str]:
+    """在多个并发度下回放录制的响应体，与黄金输出逐字节比对"""
+    if not os.path.exists(GOLDEN_FILE) or not os.path.isdir(BODIES_DIR):
+        return [f"[GOLDEN] 未找到 {GOLDEN_FILE} 或 {BODIES_DIR}，请先运行 python regress.py record"]
+    with open(GOLDEN_FILE, "rb") as f:
+        golden = f.read()
+
+    errors = []
+    for max_workers in GOLDEN_WORKERS:
+        output = replay(BODIES_DIR, max_workers=max_workers)
+        if output == golden:
+            continue
+        out_lines = output.decode("utf-8").splitlines()
+        golden_lines = golden.decode("utf-8").splitlines()
+        for no, (a, b) in enumerate(zip(out_lines, golden_lines), 1):
+            if a != b:
+                errors.append(f"[GOLDEN] 并发 {max_workers}: 第 {no} 行不一致:\n  期望: {b}\n  实际: {a}")
+                break
+        else:
+            errors.append(f"[GOLDEN] 并发 {max_workers}: 行数不一致: "
+                          f"期望 {len(golden_lines)}，实际 {len(out_lines)}")
+    if not errors:
+        logging.info(f"[GOLDEN] ✓ 并发 {GOLDEN_WORKERS} 下输出均与黄金文件逐字节一致")
+    return errors
+
+
+# ===== 性质测试 =====
+
+_NAMES = ["CCTV-1", "CCTV 1 综合", "CCTV5+", "CCTV-13新闻", "湖南卫视", "湖南衛視HD",
+          "NBA", "NBA杯", "欧冠", "德甲联赛", "日韩动漫", "国产动漫", "测试频道",
+          "广告台", "Channel, With Comma", "未知"]
+
+
+def _random_url(rng: random.Random) -> str:
+    host = rng.choice(["a.example.com", "b.example.com", "127.0.0.1:8080"])
+    query = rng.choice(["", "?t=1", "?token=abc", "?id=5", "?id=5&ts=9"])
+    return f"http://{host}/live/{rng.randint(0, 20)}.m3u8{query}"
+
+
+def _random_extinf(rng: random.Random, name: str) -> str:
+    variants = [
+        f'#EXTINF:-1 tvg-id="{name}" tvg-name="{name}" tvg-logo="" group-title="原分组",{name}',
+        f'#EXTINF:-1 tvg-name="{name}" group-title="原分组",{name}',
+        f'#EXTINF:-1 svg-name="{name}" svg-id="{name}",{name}',
+        f'#EXTINF:-1,{name}',
+        f'#EXTINF:-1 tvg-id="{name}"',
+        f'#EXTINF:-1 tvg-logo="x.png" group-title="",{name}',
+        '#EXTINF:-1,',
+    ]
+    return rng.choice(variants)
+
+
+def random_m3u(rng: random.Random, entries: int) -> List[str]:
+    """随机 M3U：EXTINF 变体、BOM、缺失 URL、注释与空行"""
+    lines = [rng.choice(["#EXTM3U", "\ufeff#EXTM3U", '#EXTM3U x-tvg-url="e.xml"'])]
+    for _ in range(entries):
+        lines.append(_random_extinf(rng, rng.choice(_NAMES)))
+        roll = rng.random()
+        if roll < 0.1:
+            continue  # 缺失 URL
+        if roll < 0.15:
+            lines.append("#EXTVLCOPT:http-user-agent=x")
+        if roll < 0.2:
+            lines.append("")
+        lines.append(_random_url(rng))
+    return lines
+
+
+def random_txt(rng: random.Random, entries: int) -> List[str]:
+    """随机 TXT：频道名,URL、#genre# 分组行、缺失逗号与空行"""
+    lines = [rng.choice(["央视,#genre#", "\ufeff央视,#genre#", ""])]
+    for _ in range(entries):
+        roll = rng.random()
+        if roll < 0.05:
+            lines.append("卫视,#genre#")
+        elif roll < 0.1:
+            lines.append(rng.choice(_NAMES))
+        elif roll < 0.15:
+            lines.append(f"{rng.choice(_NAMES)},")
+        else:
+            lines.append(f"{rng.choice(_NAMES)},{_random_url(rng)}")
+    return lines
+
+
+def _check_channels(channels: Dict[str, dict], rules: Dict[str, List[str]],
+                    blocklist: List[str], default_group: str) -> List[str]:
+    """频道字典不变量"""
+    errors = []
+    groups = set(rules) | {default_group}
+    for name, ch in channels.items():
+        if is_blocked(name, blocklist):
+            errors.append(f"{name}: 命中 blocklist 却未被过滤")
+        if not ch["urls"]:
+            errors.append(f"{name}: 没有 URL")
+        if any(not u or u.startswith("#") for u in ch["urls"]):
+            errors.append(f"{name}: URL 非法 {ch['urls']}")
+        for i, u in enumerate(ch["urls"]):
+            if any(are_urls_similar(u, other) for other in ch["urls"][:i]):
+                errors.append(f"{name}: URL 重复 {u}")
+        if ch["group"] not in groups:
+            errors.append(f"{name}: 分组 {ch['group']} 不在规则中")
+        if ch["line"].count("group-title=") != 1 or f'group-title="{ch["group"]}"' not in ch["line"]:
+            errors.append(f"{name}: group-title 异常 {ch['line']}")
+    return errors
+
+
+def check_properties(iterations: int = 300, seed: int = 0) -> List[str]:
+    """随机输入下的解析、合并、导出不变量"""
+    config = load_config()
+    groups = load_groups()
+    alias_map = load_alias()
+    rules = groups["rules"]
+    blocklist = groups["blocklist"]
+    default_group = config["default_group"]
+    keep_multiple_urls = config["keep_multiple_urls"]
+    rng = random.Random(seed)
+    errors = []
+
+    def parse(body: bytes) -> tuple:
+        return parse_remote_source(0, "prop://", [], body, config, alias_map, rules,
+                                   blocklist, keep_multiple_urls, default_group)
+
+    outdir = tempfile.mkdtemp(prefix="kudog_prop_")
+    # 随机输入会触发大量 MISSING URL 等告警，校验期间屏蔽
+    logging.disable(logging.WARNING)
+    try:
+        for it in range(iterations):
+            lines = random_m3u(rng, rng.randint(0, 40)) if rng.random() < 0.7 \
+                else random_txt(rng, rng.randint(0, 40))
+            body = "\n".join(lines).encode("utf-8")
+            _, channels, success, _, error_msg = parse(body)
+            if not success:
+                if body.strip() and error_msg != "返回空内容":
+                    errors.append(f"[PROP#{it}] 解析失败: {error_msg}")
+                continue
+
+            problems = _check_channels(channels, rules, blocklist, default_group)
+
+            # 确定性：相同输入得到相同结果
+            if parse(body)[1] != channels:
+                problems.append("相同输入解析结果不同")
+
+            # 合并幂等：再次合并同一源不改变结果
+            for primary in (True, False):
+                target = copy.deepcopy(channels)
+                merge_channels(target, copy.deepcopy(channels), primary, keep_multiple_urls)
+                if target != channels:
+                    problems.append(f"重复合并改变结果 (primary={primary})")
+
+            # 导出：每个 EXTINF 后紧跟至少一个 URL，频道数一致
+            outfile = os.path.join(outdir, "prop.m3u")
+            export_m3u(channels, [], list(rules), "", keep_multiple_urls,
+                       outfile=outfile, default_group=default_group)
+            with open(outfile, "r", encoding="utf-8") as f:
+                exported = f.read().splitlines()
+            extinf = [i for i, line in enumerate(exported) if line.startswith("#EXTINF")]
+            if len(extinf) != len(channels):
+                problems.append(f"导出频道数 {len(extinf)} != {len(channels)}")
+            if any(i + 1 >= len(exported) or exported[i + 1].startswith("#") for i in extinf):
+                problems.append("导出的 EXTINF 后缺少 URL")
+
+            errors.extend(f"[PROP#{it}] {p}" for p in problems)
+    finally:
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(outdir, ignore_errors=True)
+
+    if not errors:
+        logging.info(f"[PROP] ✓ {iterations} 组随机输入全部通过")
+    return errors
+
+
+# ===== 频道聚类 =====
+
+# (输入频道名, 期望的簇)；顺序即优先级，簇以代表名开头
+CLUSTER_CASES = [
+    (["CCTV 1 综合", "CCTV1-綜合HD", "CCTV11", "CCTV-1"],
+     [["CCTV 1 综合", "CCTV1-綜合HD"], ["CCTV11"], ["CCTV-1"]]),
+    (["CCTV5+", "CCTV5", "湖南卫视", "湖南衛視4K", "湖南卫视高清"],
+     [["CCTV5+"], ["CCTV5"], ["湖南卫视", "湖南衛視4K", "湖南卫视高清"]]),
+    # 4K/8K 属于台名本身，不能当作画质后缀去除
+    (["CCTV4K", "CCTV4", "CCTV8K", "CCTV8", "CCTV-4K", "CCTV-8K"],
+     [["CCTV4K", "CCTV-4K"], ["CCTV4"], ["CCTV8K", "CCTV-8K"], ["CCTV8"]]),
+    # 高频 n-gram 截断后相似度不应随语料规模变化
+    (["CCTV13新闻", "CCTV13新闻台"], [["CCTV13新闻", "CCTV13新闻台"]]),
+    ([f"CCTV测试{i}号" for i in range(200)] + ["CCTV13新闻", "CCTV13新闻台"],
+     [[f"CCTV测试{i}号"] for i in range(200)] + [["CCTV13新闻", "CCTV13新闻台"]]),
+]
+
+
+def check_cluster() -> List[str]:
+    """频道聚类固定用例"""
+    errors = []
+    for names, expected in CLUSTER_CASES:
+        clusters = sorted(cluster_names(names).values())
+        if clusters != sorted(expected):
+            errors.append(f"[CLUSTER] {names}: 期望 {expected}，实际 {clusters}")
+
+    # 含 ',' 的频道名照常合并，但不能写进以 ',' 分隔的别名建议
+    channels = {name: {"line": f"#EXTINF:-1,{name}", "urls": [f"http://{i}.test/live"]}
+                for i, name in enumerate(["CCTV1 综合", "CCTV1,综合", "湖南卫视", "湖南卫视HD"])}
+    merged, suggestions = merge_clusters(channels, keep_multiple_urls=True)
+    if sorted(merged) != ["CCTV1 综合", "湖南卫视"] or suggestions != ["湖南卫视,湖南卫视HD"]:
+        errors.append(f"[CLUSTER] 含 ',' 的频道名: 期望合并为 ['CCTV1 综合', '湖南卫视'] 且仅建议 "
+                      f"['湖南卫视,湖南卫视HD']，实际 {sorted(merged)}，{suggestions}")
+    if not errors:
+        logging.info(f"[CLUSTER] ✓ {len(CLUSTER_CASES)} 组聚类用例全部通过")
+    return errors
+
+
+# ===== 台标补全 =====
+
+SET_LOGO_CASES = [
+    ('#EXTINF:-1 tvg-logo="old.png" group-title="央视",CCTV1',
+     '#EXTINF:-1 tvg-logo="new.png" group-title="央视",CCTV1'),
+    ('#EXTINF:-1 tvg-name="CCTV1" group-title="央视",CCTV1',
+     '#EXTINF:-1 tvg-name="CCTV1" tvg-logo="new.png" group-title="央视",CCTV1'),
+    ('#EXTINF:-1,CCTV1', '#EXTINF:-1 tvg-logo="new.png",CCTV1'),
+]
+
+
+class _StubResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.headers = {"Content-Type": "image/png"} if status_code == 200 else {}
+        self.content = b"\x89PNG" if status_code == 200 else b""
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def close(self):
+        pass
+
+
+class _StubSession:
+    """只对 valid 中的地址返回图片，并记录所有请求"""
+
+    def __init__(self, valid):
+        self.valid = set(valid)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _respond(self, url: str) -> _StubResponse:
+        with self._lock:
+            self.requests.append(url)
+        return _StubResponse(200 if url in self.valid else 404)
+
+    def head(self, url, **kwargs):
+        return self._respond(url)
+
+    def get(self, url, **kwargs):
+        return self._respond(url)
+
+
+def _logo_of(line: str) -> Optional[str]:
+    m = re.search(r'tvg-logo="([^"]*)"', line)
+    return m.group(1) if m else None
+
+
+def check_enricher() -> List[str]:
+    """台标补全：set_logo、缓存命中 / 过期 / 负缓存、模板变更、镜像前缀"""
+    errors = []
+    for line, expected in SET_LOGO_CASES:
+        actual = set_logo(line, "new.png")
+        if actual != expected:
+            errors.append(f"[LOGO] set_logo({line!r}): 期望 {expected!r}，实际 {actual!r}")
+
+    valid_url = "http://logo.test/CCTV1.png"
+    own_logo = "http://own.test/a.png"
+    expected_logos = {"CCTV1": valid_url, "无台标": None, "A/B": None, "自带": own_logo}
+    expected_requests = sorted([valid_url, "http://logo.test/%E6%97%A0%E5%8F%B0%E6%A0%87.png",
+                                "http://logo.test/A%2FB.png"])
+
+    def run(cfg, valid=(valid_url,)):
+        channels = {
+            "CCTV1": {"line": '#EXTINF:-1 group-title="央视",CCTV1', "urls": []},
+            "无台标": {"line": '#EXTINF:-1 group-title="其他",无台标', "urls": []},
+            "A/B": {"line": '#EXTINF:-1 group-title="其他",A/B', "urls": []},
+            "自带": {"line": f'#EXTINF:-1 tvg-logo="{own_logo}" group-title="其他",自带', "urls": []},
+        }
+        session = _StubSession(valid)
+        enrich_logos(channels, {"logos": {}}, cfg, session)
+        logos = {name: _logo_of(ch["line"]) for name, ch in channels.items()}
+        return logos, sorted(session.requests)
+
+    workdir = tempfile.mkdtemp(prefix="kudog-logo-")
+    try:
+        config = {
+            "timeout": 1,
+            "max_concurrent_downloads": 2,
+            "logo_url_template": "http://logo.test/{name}.png",
+            "logo_cache_file": os.path.join(workdir, "logo_cache.json"),
+            "logo_cache_ttl": 1,
+        }
+
+        # 首次运行：未命中的频道全部校验，频道名中的 '/' 需转义
+        logos, requests_made = run(config)
+        if requests_made != expected_requests:
+            errors.append(f"[LOGO] 首次预取请求: 期望 {expected_requests}，实际 {requests_made}")
+        if logos != expected_logos:
+            errors.append(f"[LOGO] 首次补全: 期望 {expected_logos}，实际 {logos}")
+
+        # TTL 内：有效与无效结果都命中缓存，不再请求
+        logos, requests_made = run(config)
+        if requests_made or logos != expected_logos:
+            errors.append(f"[LOGO] 缓存命中: 期望无请求且结果 {expected_logos}，"
+                          f"实际请求 {requests_made}，结果 {logos}")
+
+        # TTL 过期：全部重新校验
+        with open(config["logo_cache_file"], "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        for entry in cache.values():
+            entry["ts"] -= 2 * 3600
+        with open(config["logo_cache_file"], "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        _, requests_made = run(config)
+        if requests_made != expected_requests:
+            errors.append(f"[LOGO] 缓存过期: 期望重新请求 {expected_requests}，实际 {requests_made}")
+
+        # 模板变更：旧缓存（包括负缓存）视为未命中
+        new_logo = "http://logo2.test/CCTV1.png"
+        logos, requests_made = run(dict(config, logo_url_template="http://logo2.test/{name}.png"),
+                                   valid=(new_logo,))
+        if len(requests_made) != 3 or logos["CCTV1"] != new_logo:
+            errors.append(f"[LOGO] 模板变更: 期望重新校验 3 个频道并使用 {new_logo}，"
+                          f"实际请求 {requests_made}，台标 {logos['CCTV1']}")
+
+        # 镜像：未配置对外前缀时拒绝配置，补全时也不会写出本地路径
+        mirror_dir = os.path.join(workdir, "mirror")
+        try:
+            validate_config({"ua": "", "epg": "", "timeout": 1, "output_file": "x.m3u",
+                             "logo_mirror_dir": mirror_dir})
+            errors.append("[LOGO] 配置 logo_mirror_dir 而无前缀时 validate_config 未报错")
+        except ValueError:
+            pass
+        logos, _ = run(dict(config, logo_mirror_dir=mirror_dir))
+        if logos != expected_logos or os.path.exists(mirror_dir):
+            errors.append(f"[LOGO] 无前缀镜像: 期望保留原始地址且不下载，实际 {logos}")
+
+        prefix = "https://cdn.test/logo/"
+        logos, _ = run(dict(config, logo_mirror_dir=mirror_dir, logo_mirror_url_prefix=prefix))
+        mirrored = logos["CCTV1"] or ""
+        if not mirrored.startswith(prefix) or not os.path.exists(
+                os.path.join(mirror_dir, mirrored[len(prefix):])):
+            errors.append(f"[LOGO] 镜像地址应位于对外前缀下且文件已写入: {mirrored}")
+        # 下载失败的台标保留原始地址
+        if logos["自带"] != own_logo:
+            errors.append(f"[LOGO] 镜像失败时应保留原始地址: {logos['自带']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if not errors:
+        logging.info("[LOGO] ✓ 台标补全用例全部通过")
+    return errors
+
+
+# ===== 吞吐测试 =====
+
+def synthetic_sources(count: int, entries: int, seed: int = 1) -> List[List[str]]:
+    """合成多个相互重叠的源，用于吞吐测试"""
+    rng = random.Random(seed)
+    names = [f"频道{i}" for i in range(entries // 2)] + _NAMES
+    sources = []
+    for _ in range(count):
+        lines = ["#EXTM3U"]
+        for _ in range(entries):
+            name = rng.choice(names)
+            lines.append(f'#EXTINF:-1 tvg-name="{name}" tvg-logo="" group-title="x",{name}')
+            lines.append(_random_url(rng))
+        sources.append(lines)
+    return sources
+
+
+def measure_throughput(entries: int = 1000, count: int = 4, repeat: int = 5) -> Dict[str, float]:
+    """
+    分别测量 process_lines / merge_channels / export_m3u 的 频道/秒，
+    以及每阶段相对参考负载的倍数（键名加 "/calibration" 后缀）
+    每轮前后各测一次参考负载取平均，倍数取 repeat 轮的中位数，抵消机器速度差异与抖动
+    """
+    rounds = []
+    for _ in range(repeat):
+        before = _timed_rate(_calibration_workload, 1)
+        rates = _measure_once(entries, count)
+        calibration = (before + _timed_rate(_calibration_workload, 1)) / 2
+        rounds.append({stage: (rate, rate / calibration) for stage, rate in rates.items()})
+
+    result = {}
+    for stage in rounds[0]:
+        result[stage] = statistics.median(r[stage][0] for r in rounds)
+        result[f"{stage}/calibration"] = statistics.median(r[stage][1] for r in rounds)
+    return result
+
+
+def _calibration_workload() -> None:
+    """固定的纯 Python 参考负载（正则、字符串、字典），用于抵消机器间的速度差异"""
+    table = {}
+    for i in range(2000):
+        name = f'#EXTINF:-1 tvg-name="频道{i}" group-title="x",频道{i}'
+        m = re.search(r'tvg-name="([^"]+)"', name)
+        table[m.group(1).lower()] = name.split(",", 1)[1]
+
+
+def _timed_rate(fn, units: int, min_time: float = 0.2) -> float:
+    """重复执行 fn 直到累计耗时不少于 min_time，返回 单位/秒（耗时过短的阶段单次计时误差太大）"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return units * runs / elapsed
+
+
+def _measure_once(entries: int, count: int) -> Dict[str, float]:
+    """单次吞吐测量"""
+    config = load_config()
+    groups = load_groups()
+    alias_map = load_alias()
+    rules = groups["rules"]
+    default_group = config["default_group"]
+    keep_multiple_urls = config["keep_multiple_urls"]
+    sources = synthetic_sources(count, entries)
+
+    start = time.perf_counter()
+    parsed = []
+    for lines in sources:
+        temp_channels = {}
+        process_lines(lines[1:], alias_map, rules, groups["blocklist"],
+                      keep_multiple_urls, temp_channels, default_group=default_group)
+        parsed.append(temp_channels)
+    process_rate = count * entries / (time.perf_counter() - start)
+
+    def merge_all():
+        merged = {}
+        for i, temp_channels in enumerate(parsed):
+            merge_channels(merged, temp_channels, i == 0, keep_multiple_urls)
+        return merged
+
+    channels = merge_all()
+    merge_rate = _timed_rate(merge_all, sum(len(c) for c in parsed))
+
+    outdir = tempfile.mkdtemp(prefix="kudog_bench_")
+    # 导出会逐次打印分组统计，测量期间屏蔽
+    logging.disable(logging.INFO)
+    try:
+        export_rate = _timed_rate(
+            lambda: export_m3u(channels, [], list(rules), "", keep_multiple_urls,
+                               outfile=os.path.join(outdir, "bench.m3u"),
+                               default_group=default_group),
+            len(channels)
+        )
+    finally:
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(outdir, ignore_errors=True)
+
+    return {"process_lines": process_rate, "merge_channels": merge_rate,
+            "export_m3u": export_rate}
+
+
+def relative_throughput(rates: Dict[str, float]) -> Dict[str, float]:
+    """各阶段吞吐相对参考负载的倍数，不同机器之间可比"""
+    return {stage.split("/")[0]: ratio for stage, ratio in rates.items()
+            if stage.endswith("/calibration")}
+
+
+def check_throughput(tolerance: float) -> List[str]:
+    """相对吞吐低于基线 × tolerance 时失败"""
+    if not os.path.exists(BASELINE_FILE):
+        return [f"[BENCH] 未找到 {BASELINE_FILE}，请先运行 python regress.py record"]
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    rates = measure_throughput()
+    relative = relative_throughput(rates)
+    errors = []
+    for stage, ratio in relative.items():
+        logging.info(f"[BENCH] {stage}: {rates[stage]:.0f} 频道/秒（参考负载的 {ratio:.3g} 倍）")
+        if stage in baseline and ratio < baseline[stage] * tolerance:
+            errors.append(f"[BENCH] {stage} 吞吐下降: {ratio:.3g} < 基线 {baseline[stage]:.3g} × {tolerance}")
+    return errors
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="kudog 回归与吞吐测试")
+    parser.add_argument("mode", nargs="?", choices=["check", "record"], default="check",
+                        help="record: 用参考版本生成黄金输出并记录吞吐基线；check: 离线校验")
+    parser.add_argument("--fetch", action="store_true",
+                        help="record 时重新抓取真实远程源响应体（默认沿用 regress/bodies）")
+    parser.add_argument("--ref", default=REFERENCE_REV,
+                        help=f"生成黄金输出所用的参考版本（默认 {REFERENCE_REV}）")
+    parser.add_argument("--iterations", type=int, default=300, help="性质测试随机输入组数")
+    parser.add_argument("--seed", type=int, default=0, help="性质测试随机种子")
+    parser.add_argument("--tolerance", type=float, default=0.8,
+                        help="相对吞吐允许降到基线的比例（默认 0.8）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s: %(message)s",
+        datefmt="%H:%M:%S"
+    )
+
+    if args.mode == "record":
+        os.makedirs(REGRESS_DIR, exist_ok=True)
+        if args.fetch:
+            record_bodies(load_config(), load_sources())
+        record_golden(args.ref)
+        rates = measure_throughput()
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(relative_throughput(rates), f, indent=2)
+        logging.info(f"[RECORD] 已记录吞吐基线: {BASELINE_FILE}")
+        return 0
+
+    errors = check_golden()
+    errors += check_cluster()
+    errors += check_enricher()
+    errors += check_properties(args.iterations, args.seed)
+    errors += check_throughput(args.tolerance)
+
+    for error in errors:
+        logging.error(error)
+    if errors:
+        logging.error(f"[✗] 共 {len(errors)} 项失败")
+        return 1
+    logging.info("[✓] 全部校验通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())